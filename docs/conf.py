@@ -16,6 +16,7 @@
 # For the full list of built-in configuration values, see the documentation:
 # https://www.sphinx-doc.org/en/master/usage/configuration.html
 
+import os
 from itertools import chain
 from pathlib import Path
 
@@ -61,6 +62,45 @@ templates_path = ["templates"]
 numfig = True
 
 
+# test logs larger than this are truncated when embedded into the documentation
+MAX_LOG_BYTES = 4 * 1024 * 1024
+# with this many test logs or more, all logs are shown in a single combined block
+COMBINE_TEST_LOGS_FROM = 20
+
+
+def _find_test_logs(root: Path):
+    """Recursively yield the directory entries of all test.log files below root."""
+    # the report directories are often missing, e.g. in CI sandboxes
+    if not root.is_dir():
+        return
+
+    pending = [root]
+    while pending:
+        try:
+            entries = os.scandir(pending.pop())
+        except OSError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    pending.append(entry.path)
+                elif entry.name == "test.log" and entry.is_file():
+                    yield entry
+
+
+def _read_test_log(log_file: Path) -> str:
+    """Read a test.log file, truncating it to MAX_LOG_BYTES."""
+    try:
+        with log_file.open("rb") as f:
+            raw = f.read(MAX_LOG_BYTES + 1)
+        content = raw[:MAX_LOG_BYTES].decode("utf-8", errors="replace")
+        if len(raw) > MAX_LOG_BYTES:
+            content += "\n... [truncated]"
+    except Exception as e:
+        content = f"Error reading file: {e}"
+    return content
+
+
 class DisplayTestLogs(Directive):
     """Find and display the raw content of all test.log files."""
 
@@ -68,33 +108,48 @@ class DisplayTestLogs(Directive):
         env = self.state.document.settings.env
         ws_root = Path(env.app.srcdir).parent
 
-        result_nodes = []
-        for log_file in chain(
-            (ws_root / "bazel-testlogs").rglob("test.log"),
-            (ws_root / "tests-report").rglob("test.log"),
-        ):
-            rel_path = log_file.relative_to(ws_root)
-
-            title = nodes.rubric(text=str(rel_path))
-            result_nodes.append(title)
-
-            try:
-                content = log_file.read_text(encoding="utf-8")
-            except Exception as e:
-                content = f"Error reading file: {e}"
+        log_entries = list(
+            chain(
+                _find_test_logs(ws_root / "bazel-testlogs"),
+                _find_test_logs(ws_root / "tests-report"),
+            )
+        )
 
-            code = nodes.literal_block(content, content)
-            code["language"] = "text"
-            code["source"] = str(rel_path)
-            result_nodes.append(code)
+        logs = []
+        for entry in log_entries:
+            # Sphinx re-reads this document only if one of the logs changed
+            env.note_dependency(entry.path)
+            log_file = Path(entry.path)
+            logs.append((str(log_file.relative_to(ws_root)), _read_test_log(log_file)))
 
-        if not result_nodes:
+        if not logs:
             para = nodes.paragraph(
                 text="No test.log files found in bazel-testlogs or tests-report."
             )
-            result_nodes.append(para)
-
-        return result_nodes
+            return [para]
+
+        if len(logs) < COMBINE_TEST_LOGS_FROM:
+            result_nodes = []
+            for rel_path, content in logs:
+                title = nodes.rubric(text=rel_path)
+                result_nodes.append(title)
+
+                code = nodes.literal_block(content, content)
+                code["language"] = "text"
+                code["source"] = rel_path
+                result_nodes.append(code)
+            return result_nodes
+
+        # many logs are combined into a single block to keep the document tree small
+        index = nodes.paragraph(
+            text="Test logs: " + ", ".join(rel_path for rel_path, _ in logs)
+        )
+        combined = "\n".join(
+            f"=== {rel_path} ===\n{content}\n" for rel_path, content in logs
+        )
+        code = nodes.literal_block(combined, combined)
+        code["language"] = "text"
+        return [index, code]
 
 
 def setup(app):
@@ -10,6 +10,33 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 # *******************************************************************************
+import json
+
+try:
+    # orjson is considerably faster, but it is not required to generate the configuration
+    from orjson import dumps
+except ImportError:
+
+    def dumps(obj) -> bytes:
+        # compact like orjson and the pre-serialized templates
+        return json.dumps(obj, separators=(",", ":")).encode("utf-8")
+
+
+def serialize_entry(entry) -> bytes:
+    # entries which are generated from a template are already serialized
+    return entry if isinstance(entry, bytes) else dumps(entry)
+
+
+def write_json_array(file, entries, indent: bytes = b"  "):
+    # Writes the value of a member of the top level object, the closing bracket is
+    # indented once and the entries, which are serialized one at a time, twice
+    separator = b"["
+    for entry in entries:
+        file.write(separator + b"\n" + indent + indent + serialize_entry(entry))
+        separator = b","
+    file.write(b"[]" if separator == b"[" else b"\n" + indent + b"]")
+
+
 def get_process_index_range(process_count: int, process_group_index: int):
     # Every ProcessGroup gets the same number of processes
     # The Process Index is a globally unique increasing number
@@ -11,290 +11,231 @@
 # SPDX-License-Identifier: Apache-2.0
 # *******************************************************************************
 import argparse
+from concurrent.futures import ProcessPoolExecutor
+from itertools import chain, repeat
 from pathlib import Path
-import os
 import json
-from gen_common_cfg import get_process_index_range
-
-
-def get_process(index: int, process_group: str):
-    return (
-        """
-{
-    "index": """
-        + str(index)
-        + """,
-    "shortName": "demo_application"""
-        + str(index)
-        + """",
-    "identifier": "demo_app"""
-        + str(index)
-        + "_"
-        + process_group
-        + '''",
-    "processType": "REGULAR_PROCESS",
-    "refProcessGroupStates": [
-        {
-            "identifier": "'''
-        + process_group
-        + """/Startup"
-        }
-    ],
-    "processExecutionErrors": [
-        {
-            "processExecutionError": 1
-        }
-    ]
-}
-"""
-    )
+import os
+from gen_common_cfg import (
+    dumps,
+    get_process_index_range,
+    serialize_entry,
+    write_json_array,
+)
+
+# Below this number of processes in total, starting worker processes takes longer
+# than generating the process groups one after another
+PARALLEL_MIN_PROCESS_COUNT = 10000
+
+# Checkpoint ids reported by every demo app
+DEMO_APP_CHECKPOINT_IDS = (1,)
+
+
+# Processes only differ in index and process group, so they are not built as dicts
+# and serialized one by one, but formatted from this pre-serialized template
+PROCESS_TEMPLATE = (
+    '{{"index":{index},"shortName":"demo_application{index}",'
+    '"identifier":"demo_app{index}_{process_group}","processType":"REGULAR_PROCESS",'
+    '"refProcessGroupStates":[{{"identifier":"{process_group}/Startup"}}],'
+    '"processExecutionErrors":[{{"processExecutionError":1}}]}}'
+)
+
+
+def get_process(index: int, escaped_process_group: str):
+    return PROCESS_TEMPLATE.format(
+        index=index, process_group=escaped_process_group
+    ).encode("utf-8")
 
 
 def get_monitor_interfaces(index: int, process_group: str):
-    return (
-        """
-{
-    "instanceSpecifier": "demo/demo_application"""
-        + str(index)
-        + """/Port1",
-    "processShortName": "demo_application"""
-        + str(index)
-        + """",
-    "portPrototype": "Port1",
-    "interfacePath": "demo_application_"""
-        + str(index)
-        + "_"
-        + process_group
-        + """",
-    "refProcessIndex": """
-        + str(index)
-        + """,
-    "permittedUid": 0
-}
-"""
-    )
+    return {
+        "instanceSpecifier": f"demo/demo_application{index}/Port1",
+        "processShortName": f"demo_application{index}",
+        "portPrototype": "Port1",
+        "interfacePath": f"demo_application_{index}_{process_group}",
+        "refProcessIndex": index,
+        "permittedUid": 0,
+    }
 
 
 def get_checkpoints(index: int):
-    # Every demo app has three checkpoints
     return [
-        """
-{
-    "shortName": "Checkpoint"""
-        + str(index)
-        + "_1"
-        + """",
-    "checkpointId": 1,
-    "refInterfaceIndex": """
-        + str(index)
-        + """
-}"""
-    ]
-
-
-def get_alive_supervisions(index: int, process_group: str):
-    # Every demo app has three checkpoints and the first checkpoint is used for alive supervision
-    checkpointIdx = index * 1
-    return (
-        """
-{
-    "ruleContextKey": "AliveSupervision"""
-        + str(index)
-        + """",
-    "refCheckPointIndex": """
-        + str(checkpointIdx)
-        + """,
-    "aliveReferenceCycle": 100.0,
-    "minAliveIndications": 1,
-    "maxAliveIndications": 3,
-    "isMinCheckDisabled": false,
-    "isMaxCheckDisabled": false,
-    "failedSupervisionCyclesTolerance": 1,
-    "refProcessIndex": """
-        + str(index)
-        + ''',
-    "refProcessGroupStates": [
         {
-            "identifier": "'''
-        + process_group
-        + """/Startup"
+            "shortName": f"Checkpoint{index}_{checkpoint_id}",
+            "checkpointId": checkpoint_id,
+            "refInterfaceIndex": index,
         }
+        for checkpoint_id in DEMO_APP_CHECKPOINT_IDS
     ]
-}
-"""
-    )
+
+
+def get_alive_supervisions(index: int, startup_refs: list):
+    # The first checkpoint of every demo app is used for alive supervision
+    checkpointIdx = index * len(DEMO_APP_CHECKPOINT_IDS)
+    return {
+        "ruleContextKey": f"AliveSupervision{index}",
+        "refCheckPointIndex": checkpointIdx,
+        "aliveReferenceCycle": 100.0,
+        "minAliveIndications": 1,
+        "maxAliveIndications": 3,
+        "isMinCheckDisabled": False,
+        "isMaxCheckDisabled": False,
+        "failedSupervisionCyclesTolerance": 1,
+        "refProcessIndex": index,
+        "refProcessGroupStates": startup_refs,
+    }
 
 
 def get_local_supervisions(index: int):
-    return (
-        """
-{
-    "ruleContextKey": "LocalSupervision"""
-        + str(index)
-        + """",
-    "infoRefInterfacePath": "demo_application_"""
-        + str(index)
-        + """",
-    "hmRefAliveSupervision": [
-        {
-            "refAliveSupervisionIdx": """
-        + str(index)
-        + """
-        }
-    ]
-}
-"""
-    )
+    return {
+        "ruleContextKey": f"LocalSupervision{index}",
+        "infoRefInterfacePath": f"demo_application_{index}",
+        "hmRefAliveSupervision": [{"refAliveSupervisionIdx": index}],
+    }
 
 
 def get_global_supervisions(
-    process_count: int, process_group_index: int, process_group: str
+    process_indices: list, process_group: str, startup_refs: list
 ):
-    localSupervisionRefs = []
-    processRefs = []
-    for i in get_process_index_range(process_count, process_group_index):
-        localSupervisionRefs.append(
-            json.loads(
-                """
-{
-    "refLocalSupervisionIndex": """
-                + str(i)
-                + """
-}"""
-            )
-        )
-        processRefs.append(
-            json.loads(
-                """
-{
-    "index": """
-                + str(i)
-                + """
-}"""
-            )
-        )
+    return {
+        "ruleContextKey": f"GlobalSupervision_{process_group}",
+        "isSeverityCritical": False,
+        "localSupervision": [{"refLocalSupervisionIndex": i} for i in process_indices],
+        "refProcesses": [{"index": i} for i in process_indices],
+        "refProcessGroupStates": startup_refs,
+    }
 
-    globalSupervisions = json.loads(
-        """
-{
-    "ruleContextKey": "GlobalSupervision_"""
-        + process_group
-        + '''",
-    "isSeverityCritical": false,
-    "localSupervision": [],
-    "refProcesses": [],
-    "refProcessGroupStates": [
-        {
-            "identifier": "'''
-        + process_group
-        + """/Startup"
-        }
-    ]
-}
-"""
-    )
-    globalSupervisions["localSupervision"].extend(localSupervisionRefs)
-    globalSupervisions["refProcesses"].extend(processRefs)
-    return json.dumps(globalSupervisions)
 
-
-def get_recovery_notifications(
-    process_count: int, process_group_index: int, process_group: str
-):
-    return (
-        """
-{
-    "shortName" : "RecoveryNotification_"""
-        + process_group
-        + '''",
-    "recoveryNotificationTimeout" : 4000.0,
-    "processGroupMetaModelIdentifier" : "'''
-        + process_group
-        + """/Recovery",
-    "refGlobalSupervisionIndex" : """
-        + str(process_group_index)
-        + """,
-    "instanceSpecifier" : "",
-    "shouldFireWatchdog" : false
-}
-"""
-    )
+def get_recovery_notifications(process_group_index: int, process_group: str):
+    return {
+        "shortName": f"RecoveryNotification_{process_group}",
+        "recoveryNotificationTimeout": 4000.0,
+        "processGroupMetaModelIdentifier": f"{process_group}/Recovery",
+        "refGlobalSupervisionIndex": process_group_index,
+        "instanceSpecifier": "",
+        "shouldFireWatchdog": False,
+    }
 
 
 def gen_health_monitor_cfg_for_process_group(
-    config, process_count: int, process_group: str, process_group_index: int
+    process_count: int,
+    process_group: str,
+    process_group_index: int,
+    verbose: bool = False,
 ):
-    processes = []
-    monitorInterfaces = []
-    checkpoints = []
-    hmAliveSupervisions = []
-    hmLocalSupervisions = []
-    hmGlobalSupervision = []
-    hmRecoveryNotifications = []
-
-    for process_index in get_process_index_range(process_count, process_group_index):
-        print(f"process Index {process_index} for FG {process_group}")
-        processes.append(json.loads(get_process(process_index, process_group)))
-        monitorInterfaces.append(
-            json.loads(get_monitor_interfaces(process_index, process_group))
-        )
+    process_indices = list(get_process_index_range(process_count, process_group_index))
+    if verbose:
+        for process_index in process_indices:
+            print(f"process Index {process_index} for FG {process_group}")
+    else:
+        print(f"{len(process_indices)} processes for FG {process_group}")
 
-        for cp in get_checkpoints(process_index):
-            checkpoints.append(json.loads(cp))
+    # all entries of a process group reference the same Startup state, so the
+    # reference list is shared between them; entries are only serialized and
+    # never modified afterwards, therefore sharing a single list is safe
+    startup_refs = [{"identifier": f"{process_group}/Startup"}]
+    # the process group name is inserted into templates, so it has to be escaped once
+    escaped_process_group = json.dumps(process_group)[1:-1]
 
-        hmAliveSupervisions.append(
-            json.loads(get_alive_supervisions(process_index, process_group))
-        )
-        hmLocalSupervisions.append(json.loads(get_local_supervisions(process_index)))
+    # The entries are created lazily, so that they can be written out one by one
+    # without holding the whole configuration in memory. This does not apply when
+    # the process groups are generated in parallel, see write_health_monitor_cfg.
+    return {
+        "process": (get_process(i, escaped_process_group) for i in process_indices),
+        "hmMonitorInterface": (
+            get_monitor_interfaces(i, process_group) for i in process_indices
+        ),
+        "hmSupervisionCheckpoint": (
+            cp for i in process_indices for cp in get_checkpoints(i)
+        ),
+        "hmAliveSupervision": (
+            get_alive_supervisions(i, startup_refs) for i in process_indices
+        ),
+        "hmLocalSupervision": (get_local_supervisions(i) for i in process_indices),
+        "hmGlobalSupervision": (
+            get_global_supervisions(process_indices, process_group, startup_refs),
+        ),
+        "hmRecoveryNotification": (
+            get_recovery_notifications(process_group_index, process_group),
+        ),
+    }
 
-    hmGlobalSupervision.append(
-        json.loads(
-            get_global_supervisions(process_count, process_group_index, process_group)
-        )
+
+def serialize_health_monitor_cfg_for_process_group(
+    process_count: int,
+    process_group: str,
+    process_group_index: int,
+    verbose: bool = False,
+):
+    # the serialized entries are returned as lists, so that they can be passed
+    # back from a worker process; all of them are held in memory at once
+    cfg = gen_health_monitor_cfg_for_process_group(
+        process_count, process_group, process_group_index, verbose
     )
-    hmRecoveryNotifications.append(
-        json.loads(
-            get_recovery_notifications(
-                process_count, process_group_index, process_group
+    return {
+        key: [serialize_entry(entry) for entry in entries]
+        for key, entries in cfg.items()
+    }
+
+
+def write_health_monitor_cfg(
+    out, process_count: int, process_groups: list, verbose: bool = False
+):
+    config = {
+        "versionMajor": 8,
+        "versionMinor": 0,
+        "process": [],
+        "hmMonitorInterface": [],
+        "hmSupervisionCheckpoint": [],
+        "hmAliveSupervision": [],
+        "hmDeadlineSupervision": [],
+        "hmLogicalSupervision": [],
+        "hmLocalSupervision": [],
+        "hmGlobalSupervision": [],
+        "hmRecoveryNotification": [],
+    }
+
+    if (
+        len(process_groups) > 1
+        and (os.cpu_count() or 1) > 1
+        and process_count * len(process_groups) >= PARALLEL_MIN_PROCESS_COUNT
+    ):
+        # Process groups are independent of each other, so they can be generated in
+        # parallel. The serialized entries of all process groups are then buffered in
+        # this process before they are written.
+        with ProcessPoolExecutor() as executor:
+            process_group_cfgs = list(
+                executor.map(
+                    serialize_health_monitor_cfg_for_process_group,
+                    repeat(process_count),
+                    process_groups,
+                    range(0, len(process_groups)),
+                    repeat(verbose),
+                )
             )
-        )
-    )
+    else:
+        process_group_cfgs = [
+            gen_health_monitor_cfg_for_process_group(
+                process_count, process_groups[i], i, verbose
+            )
+            for i in range(0, len(process_groups))
+        ]
 
-    config["process"].extend(processes)
-    config["hmMonitorInterface"].extend(monitorInterfaces)
-    config["hmSupervisionCheckpoint"].extend(checkpoints)
-    config["hmAliveSupervision"].extend(hmAliveSupervisions)
-    config["hmLocalSupervision"].extend(hmLocalSupervisions)
-    config["hmGlobalSupervision"].extend(hmGlobalSupervision)
-    config["hmRecoveryNotification"].extend(hmRecoveryNotifications)
-    return config
-
-
-def gen_health_monitor_cfg(process_count: int, process_groups: list):
-    config = json.loads(
-        """
-{
-    "versionMajor": 8,
-    "versionMinor": 0,
-    "process": [],
-    "hmMonitorInterface": [],
-    "hmSupervisionCheckpoint": [],
-    "hmAliveSupervision": [],
-    "hmDeadlineSupervision": [],
-    "hmLogicalSupervision": [],
-    "hmLocalSupervision": [],
-    "hmGlobalSupervision": [],
-    "hmRecoveryNotification": []
-}
-"""
-    )
+    # the configuration is streamed section by section, one entry per line
+    separator = b"{\n"
+    for key, value in config.items():
+        out.write(separator + b"    " + dumps(key) + b": ")
+        separator = b",\n"
+        if not isinstance(value, list):
+            out.write(dumps(value))
+            continue
 
-    for i in range(0, len(process_groups)):
-        gen_health_monitor_cfg_for_process_group(
-            config, process_count, process_groups[i], i
+        write_json_array(
+            out,
+            chain.from_iterable(cfg.get(key, ()) for cfg in process_group_cfgs),
+            indent=b"    ",
         )
-
-    return config
+    out.write(b"\n}\n")
 
 
 if __name__ == "__main__":
@@ -325,14 +266,19 @@ if __name__ == "__main__":
     my_parser.add_argument(
         "-o", "--out", action="store", type=Path, required=True, help="Output directory"
     )
+    my_parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Print every generated process",
+    )
     args = my_parser.parse_args()
 
-    cfg_out_path = os.path.join(args.out, f"hm_demo.json")
-    with open(cfg_out_path, "w") as f:
-        json.dump(
-            gen_health_monitor_cfg(
-                args.cppprocesses + args.rustprocesses, args.process_groups
-            ),
+    cfg_out_path = args.out / "hm_demo.json"
+    with open(cfg_out_path, "wb", buffering=1024 * 1024) as f:
+        write_health_monitor_cfg(
             f,
-            indent=4,
+            args.cppprocesses + args.rustprocesses,
+            args.process_groups,
+            args.verbose,
         )
@@ -11,10 +11,74 @@
 # SPDX-License-Identifier: Apache-2.0
 # *******************************************************************************
 import argparse
-import json
+from dataclasses import dataclass, field
 from pathlib import Path
 import os
-from gen_common_cfg import get_process_index_range
+from gen_common_cfg import get_process_index_range, write_json_array
+
+# reporting behavior of a process, indexed by whether it is a native application
+_REPORTING_BEHAVIOR = ("ReportsExecutionState", "DoesNotReportExecutionState")
+
+
+def get_execution_dependency(depends_on: dict, cache: dict):
+    # startup configs often share the same depends_on dict (e.g. all demo apps of a process group),
+    # so the resulting list is only built once per dict; it is serialized right away and never modified
+    key = id(depends_on)
+    if key not in cache:
+        cache[key] = [
+            {
+                "stateName": state,
+                "targetProcess_identifier": f"/{dependency}App/{dependency}",
+            }
+            for dependency, state in depends_on.items()
+        ]
+    return cache[key]
+
+
+@dataclass(slots=True)
+class StartupConfig:
+    process_arguments: list
+    env_variables: dict
+    scheduling_policy: str
+    scheduling_priority: int
+    enter_timeout: float
+    exit_timeout: float
+    execution_error: int
+    depends_on: dict
+    use_in: list
+    termination_behavior: str
+
+
+@dataclass(slots=True)
+class Process:
+    executable_name: str
+    uid: int
+    gid: int
+    supplementary_group_ids: list
+    restart_attempts: int
+    native_application: bool
+    special_rights: str
+    # by default process doesn't have any startup configs
+    startup_configs: dict = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class ProcessGroup:
+    process_group_states_name: str
+    processes: dict = field(default_factory=dict)
+
+
+@dataclass(slots=True)
+class Machine:
+    machine_name: str
+    default_application_timeout_enter: float
+    default_application_timeout_exit: float
+    env_variables: dict
+    # by default machine doesn't have any process groups
+    process_groups: dict = field(default_factory=dict)
+    process_group_states: dict = field(default_factory=dict)
+    # reverse lookup of process_group_states, keyed by the tuple of states
+    process_group_states_by_value: dict = field(default_factory=dict)
 
 
 class LaunchManagerConfGen:
@@ -25,166 +89,108 @@ class LaunchManagerConfGen:
     def generate_json(self, out_path):
         # generate all configured machines
         for machine in self.machines:
-            json_config = {
-                "versionMajor": 7,
-                "versionMinor": 0,
-            }
+            # the configuration is streamed entry by entry, so that it is never held in memory as a whole
+            with open(out_path, "wb") as file:
+                self.write_machine_json(file, machine)
+
+    def write_machine_json(self, file, machine):
+        file.write(b'{\n  "versionMajor": 7,\n  "versionMinor": 0,\n  "Process": ')
+        write_json_array(file, self.generate_process_json(machine))
+        file.write(b',\n  "ModeGroup": ')
+        write_json_array(file, self.generate_mode_group_json(machine))
+        file.write(b"\n}\n")
+
+    def generate_process_json(self, machine):
+        execution_dependencies = {}
+        for process_group, pg in machine.process_groups.items():
+            # state names are prefixed with the process group
+            pg_prefix = process_group + "/"
+            # configuring processes
+            for process, proc in pg.processes.items():
+                yield self.build_process_json(
+                    process, proc, process_group, pg_prefix, execution_dependencies
+                )
 
-            json_config["Process"] = []
-            json_config["ModeGroup"] = []
-            for process_group in machine["process_groups"].keys():
-                # configuring processes
-                for process in machine["process_groups"][process_group][
-                    "processes"
-                ].keys():
-                    json_config["Process"].append(
-                        {
-                            "identifier": f"{process}",
-                            "uid": machine["process_groups"][process_group][
-                                "processes"
-                            ][process]["uid"],
-                            "gid": machine["process_groups"][process_group][
-                                "processes"
-                            ][process]["gid"],
-                            "path": machine["process_groups"][process_group][
-                                "processes"
-                            ][process]["executable_name"],
-                        }
-                    )
+    def build_process_json(
+        self, process, proc, process_group, pg_prefix, execution_dependencies
+    ):
+        process_json = {
+            "identifier": process,
+            "uid": proc.uid,
+            "gid": proc.gid,
+            "path": proc.executable_name,
+        }
+
+        if proc.special_rights:
+            process_json["functionClusterAffiliation"] = proc.special_rights
+
+        process_json["numberOfRestartAttempts"] = proc.restart_attempts
+
+        process_json["executable_reportingBehavior"] = _REPORTING_BEHAVIOR[
+            bool(proc.native_application)
+        ]
 
-                    if (
-                        machine["process_groups"][process_group]["processes"][process][
-                            "special_rights"
-                        ]
-                        != ""
-                    ):
-                        json_config["Process"][-1]["functionClusterAffiliation"] = (
-                            machine["process_groups"][process_group]["processes"][
-                                process
-                            ]["special_rights"]
-                        )
-
-                    json_config["Process"][-1]["numberOfRestartAttempts"] = machine[
-                        "process_groups"
-                    ][process_group]["processes"][process]["restart_attempts"]
-
-                    if not machine["process_groups"][process_group]["processes"][
-                        process
-                    ]["native_application"]:
-                        json_config["Process"][-1]["executable_reportingBehavior"] = (
-                            "ReportsExecutionState"
-                        )
-                    else:
-                        json_config["Process"][-1]["executable_reportingBehavior"] = (
-                            "DoesNotReportExecutionState"
-                        )
-
-                    json_config["Process"][-1]["sgids"] = []
-                    for gid in machine["process_groups"][process_group]["processes"][
-                        process
-                    ]["supplementary_group_ids"]:
-                        json_config["Process"][-1]["sgids"].append({"sgid": gid})
-
-                    json_config["Process"][-1]["startupConfig"] = []
-                    for startup_config in machine["process_groups"][process_group][
-                        "processes"
-                    ][process]["startup_configs"].keys():
-                        config = machine["process_groups"][process_group]["processes"][
-                            process
-                        ]["startup_configs"][startup_config]
-                        json_config["Process"][-1]["startupConfig"].append(
-                            {
-                                "executionError": f"{config['execution_error']}",
-                                "schedulingPolicy": config["scheduling_policy"],
-                                "schedulingPriority": f"{config['scheduling_priority']}",
-                                "identifier": startup_config,
-                                "enterTimeoutValue": int(
-                                    config["enter_timeout"] * 1000
-                                ),  # convert to ms
-                                "exitTimeoutValue": int(
-                                    config["exit_timeout"] * 1000
-                                ),  # convert to ms
-                                "terminationBehavior": config["termination_behavior"],
-                                "executionDependency": [],
-                                "processGroupStateDependency": [],
-                            }
-                        )
-
-                        json_config["Process"][-1]["startupConfig"][-1][
-                            "executionDependency"
-                        ] = []
-                        for process, state in config["depends_on"].items():
-                            json_config["Process"][-1]["startupConfig"][-1][
-                                "executionDependency"
-                            ].append(
-                                {
-                                    "stateName": state,
-                                    "targetProcess_identifier": f"/{process}App/{process}",
-                                }
-                            )
-
-                        for state in config["use_in"]:
-                            json_config["Process"][-1]["startupConfig"][-1][
-                                "processGroupStateDependency"
-                            ].append(
-                                {
-                                    "stateMachine_name": f"{process_group}",
-                                    "stateName": f"{process_group}/{state}",
-                                }
-                            )
-
-                        json_config["Process"][-1]["startupConfig"][-1][
-                            "environmentVariable"
-                        ] = []
-                        for key, val in config["env_variables"].items():
-                            json_config["Process"][-1]["startupConfig"][-1][
-                                "environmentVariable"
-                            ].append({"key": key, "value": val})
-
-                        json_config["Process"][-1]["startupConfig"][-1][
-                            "processArgument"
-                        ] = []
-                        for arg in config["process_arguments"]:
-                            json_config["Process"][-1]["startupConfig"][-1][
-                                "processArgument"
-                            ].append({"argument": arg})
-
-                # configuring process groups
-                json_config["ModeGroup"].append(
+        process_json["sgids"] = [{"sgid": gid} for gid in proc.supplementary_group_ids]
+
+        process_json["startupConfig"] = [
+            {
+                "executionError": str(config.execution_error),
+                "schedulingPolicy": config.scheduling_policy,
+                "schedulingPriority": str(config.scheduling_priority),
+                "identifier": startup_config,
+                "enterTimeoutValue": int(config.enter_timeout * 1000),  # convert to ms
+                "exitTimeoutValue": int(config.exit_timeout * 1000),  # convert to ms
+                "terminationBehavior": config.termination_behavior,
+                "executionDependency": get_execution_dependency(
+                    config.depends_on, execution_dependencies
+                ),
+                "processGroupStateDependency": [
                     {
-                        "identifier": f"{process_group}",
-                        "initialMode_name": "Off",
-                        "recoveryMode_name": f"{process_group}/Recovery",
-                        "modeDeclaration": [],
+                        "stateMachine_name": process_group,
+                        "stateName": pg_prefix + state,
                     }
-                )
-                for state in machine["process_group_states"][
-                    machine["process_groups"][process_group][
-                        "process_group_states_name"
-                    ]
-                ]:
-                    # replicating bug where we mix ModeDeclarationGroups (Process Group States) and ProcessGroupSet (Process Groups)
-                    # essentially we use Process Group States declaration as Process Groups declarations
-                    # here we should use machine["process_groups"][process_group]["process_group_states_name"] instead of process_group
-                    # but we need to create new process group states declaration on the fly, so each process group has a unique set of states
-                    json_config["ModeGroup"][-1]["modeDeclaration"].append(
-                        {"identifier": f"{process_group}/{state}"}
-                    )
-
-            file = open(
-                out_path,
-                "w",
-            )
-            file.write(json.dumps(json_config, indent=2))
-            file.close()
+                    for state in config.use_in
+                ],
+                "environmentVariable": [
+                    {"key": key, "value": val}
+                    for key, val in config.env_variables.items()
+                ],
+                "processArgument": [
+                    {"argument": arg} for arg in config.process_arguments
+                ],
+            }
+            for startup_config, config in proc.startup_configs.items()
+        ]
+        return process_json
+
+    def generate_mode_group_json(self, machine):
+        for process_group, pg in machine.process_groups.items():
+            states_list = machine.process_group_states[pg.process_group_states_name]
+            pg_prefix = process_group + "/"
+            # configuring process groups
+            # replicating bug where we mix ModeDeclarationGroups (Process Group States) and ProcessGroupSet (Process Groups)
+            # essentially we use Process Group States declaration as Process Groups declarations
+            # here we should use pg.process_group_states_name instead of process_group
+            # but we need to create new process group states declaration on the fly, so each process group has a unique set of states
+            yield {
+                "identifier": process_group,
+                "initialMode_name": "Off",
+                "recoveryMode_name": pg_prefix + "Recovery",
+                "modeDeclaration": [
+                    {"identifier": pg_prefix + state} for state in states_list
+                ],
+            }
 
     def add_machine(
         self,
         name,
         default_application_timeout_enter=0.5,
         default_application_timeout_exit=0.5,
-        env_variables={"LD_LIBRARY_PATH": "/opt/lib"},
+        env_variables=None,
     ):
+        if env_variables is None:
+            env_variables = {"LD_LIBRARY_PATH": "/opt/lib"}
+
         # TODO: this is only a test code, so for various reasons we only support a single machine configuration
         if len(self.machines) > 0:
             raise Exception(
@@ -192,19 +198,16 @@ class LaunchManagerConfGen:
             )
 
         for machine in self.machines:
-            if name == machine["machine_name"]:
+            if name == machine.machine_name:
                 raise Exception(f"Machine with {name=} cannot be redefined!")
 
         self.machines.append(
-            {
-                "machine_name": name,
-                "default_application_timeout_enter": default_application_timeout_enter,
-                "default_application_timeout_exit": default_application_timeout_exit,
-                "env_variables": env_variables,
-                # by default machine doesn't have any process groups
-                "process_groups": {},
-                "process_group_states": {},
-            }
+            Machine(
+                machine_name=name,
+                default_application_timeout_enter=default_application_timeout_enter,
+                default_application_timeout_exit=default_application_timeout_exit,
+                env_variables=env_variables,
+            )
         )
 
         # returning the freshly created machine, so it can be extended elsewhere
@@ -212,15 +215,17 @@ class LaunchManagerConfGen:
         index = len(self.machines) - 1
         return {"machine": self.machines[index], "machine_index": index}
 
-    def machine_add_process_group(self, machine, name, states=["Off", "Verify"]):
-        pg_states_index = ""
+    def machine_add_process_group(self, machine, name, states=None):
+        if states is None:
+            states = ["Off", "Verify"]
 
         # process group states should be reused among different process groups
-        for key, value in machine["machine"]["process_group_states"].items():
-            if value == states:
-                pg_states_index = key
+        states_key = tuple(states)
+        pg_states_index = machine["machine"].process_group_states_by_value.get(
+            states_key
+        )
 
-        if "" == pg_states_index:
+        if pg_states_index is None:
             # TODO: at the moment this code generator only support a single machine,
             #       so we don't need to think about name space clashes between different machines...
             #       code like this should prevent this:
@@ -228,20 +233,22 @@ class LaunchManagerConfGen:
 
             # those process group states were not defined before
             pg_states_index = name
-            machine["machine"]["process_group_states"][pg_states_index] = states
-
-        if name not in machine["machine"]["process_groups"].keys():
-            machine["machine"]["process_groups"][name] = {
-                "process_group_states_name": pg_states_index,
-                "processes": {},
-            }
+            machine["machine"].process_group_states[pg_states_index] = states
+            machine["machine"].process_group_states_by_value[
+                states_key
+            ] = pg_states_index
+
+        if name not in machine["machine"].process_groups:
+            machine["machine"].process_groups[name] = ProcessGroup(
+                process_group_states_name=pg_states_index
+            )
         else:
             raise Exception(f"Process Group with {name=} cannot be redefined!")
 
         # returning the freshly created process_group, so it can be extended elsewhere
         # machine index is also included, as it could be used later to read machine wide default values
         return {
-            "process_group": machine["machine"]["process_groups"][name],
+            "process_group": machine["machine"].process_groups[name],
             "machine_index": machine["machine_index"],
         }
 
@@ -252,7 +259,7 @@ class LaunchManagerConfGen:
         executable_name=None,
         uid=1001,
         gid=1001,
-        supplementary_group_ids=[],
+        supplementary_group_ids=None,
         restart_attempts=0,
         native_application=False,
         special_rights="",
@@ -260,25 +267,26 @@ class LaunchManagerConfGen:
         if executable_name is None:
             executable_name = f"/opt/apps/{name}/{name}"
 
-        if name not in process_group["process_group"]["processes"].keys():
-            process_group["process_group"]["processes"][name] = {
-                "executable_name": executable_name,
-                "uid": uid,
-                "gid": gid,
-                "supplementary_group_ids": supplementary_group_ids,
-                "restart_attempts": restart_attempts,
-                "native_application": native_application,
-                "special_rights": special_rights,
-                # by default process doesn't have any startup configs
-                "startup_configs": {},
-            }
+        if supplementary_group_ids is None:
+            supplementary_group_ids = []
+
+        if name not in process_group["process_group"].processes:
+            process_group["process_group"].processes[name] = Process(
+                executable_name=executable_name,
+                uid=uid,
+                gid=gid,
+                supplementary_group_ids=supplementary_group_ids,
+                restart_attempts=restart_attempts,
+                native_application=native_application,
+                special_rights=special_rights,
+            )
         else:
             raise Exception(f"Process with {name=} cannot be redefined!")
 
         # returning process config, so user can add startup configs
         # machine index is also included, as it could be used later to read machine wide default values
         return {
-            "process": process_group["process_group"]["processes"][name],
+            "process": process_group["process_group"].processes[name],
             "machine_index": process_group["machine_index"],
         }
 
@@ -286,54 +294,60 @@ class LaunchManagerConfGen:
         self,
         process,
         name,
-        process_arguments=[],
-        env_variables={},
+        process_arguments=None,
+        env_variables=None,
         scheduling_policy="SCHED_OTHER",
         scheduling_priority=0,
         enter_timeout=None,
         exit_timeout=None,
         execution_error=1,
-        depends_on={},
-        use_in=[],
+        depends_on=None,
+        use_in=None,
         termination_behavior="ProcessIsNotSelfTerminating",
     ):
+        if process_arguments is None:
+            process_arguments = []
+
+        if env_variables is None:
+            env_variables = {}
+
+        if depends_on is None:
+            depends_on = {}
+
+        if use_in is None:
+            use_in = []
+
         if enter_timeout is None:
-            enter_timeout = self.machines[process["machine_index"]][
-                "default_application_timeout_enter"
-            ]
+            enter_timeout = self.machines[
+                process["machine_index"]
+            ].default_application_timeout_enter
 
         if exit_timeout is None:
-            exit_timeout = self.machines[process["machine_index"]][
-                "default_application_timeout_exit"
-            ]
+            exit_timeout = self.machines[
+                process["machine_index"]
+            ].default_application_timeout_exit
 
         # merging machine wide env variables with startup config (aka local) env variables
-        # step 1 --> start from empty set
-        merged_env_variables = {}
-        # step 2 --> overtake all env variables from global configuration
-        for key, val in self.machines[process["machine_index"]][
-            "env_variables"
-        ].items():
-            merged_env_variables[key] = val
-        # step 3 --> overtake all env variables from startup config
-        # please note that this step has to happen last, as local configuration should override global configuration
-        # to fulfill our requirements
-        for key, val in env_variables.items():
-            merged_env_variables[key] = val
-
-        if name not in process["process"]["startup_configs"].keys():
-            process["process"]["startup_configs"][name] = {
-                "process_arguments": process_arguments,
-                "env_variables": merged_env_variables,
-                "scheduling_policy": scheduling_policy,
-                "scheduling_priority": scheduling_priority,
-                "enter_timeout": enter_timeout,
-                "exit_timeout": exit_timeout,
-                "execution_error": execution_error,
-                "depends_on": depends_on,
-                "use_in": use_in,
-                "termination_behavior": termination_behavior,
-            }
+        # please note that the startup config env variables have to come last, as local configuration
+        # should override global configuration to fulfill our requirements
+        merged_env_variables = {
+            **self.machines[process["machine_index"]].env_variables,
+            **env_variables,
+        }
+
+        if name not in process["process"].startup_configs:
+            process["process"].startup_configs[name] = StartupConfig(
+                process_arguments=process_arguments,
+                env_variables=merged_env_variables,
+                scheduling_policy=scheduling_policy,
+                scheduling_priority=scheduling_priority,
+                enter_timeout=enter_timeout,
+                exit_timeout=exit_timeout,
+                execution_error=execution_error,
+                depends_on=depends_on,
+                use_in=use_in,
+                termination_behavior=termination_behavior,
+            )
         else:
             raise Exception(f"Startup configuration with {name=} cannot be redefined!")
 
@@ -341,10 +355,12 @@ class LaunchManagerConfGen:
         # end of the configuration
 
 
-def is_rust_app(process_index: int, cppprocess_count: int, rustprocess_count: int):
-    processes_per_process_group = cppprocess_count + rustprocess_count
-    process_index = process_index % processes_per_process_group
-    return process_index >= cppprocess_count
+def split_process_index_range(process_index_range: range, cppprocess_count: int):
+    # within a process group the C++ apps come first, followed by the Rust apps
+    return (
+        process_index_range[:cppprocess_count],
+        process_index_range[cppprocess_count:],
+    )
 
 
 if __name__ == "__main__":
@@ -383,6 +399,12 @@ if __name__ == "__main__":
     my_parser.add_argument(
         "-o", "--out", action="store", type=Path, required=True, help="Output directory"
     )
+    my_parser.add_argument(
+        "-v",
+        "--verbose",
+        action="store_true",
+        help="Print every generated demo app process",
+    )
     args = my_parser.parse_args()
 
     conf_gen = LaunchManagerConfGen()
@@ -450,42 +472,49 @@ if __name__ == "__main__":
             )
             exec_dependency = {}
 
-        for i in get_process_index_range(total_process_count, process_group_index):
-            if not is_rust_app(i, args.cppprocesses, args.rustprocesses):
-                demo_executable_path = "/opt/supervision_demo/cpp_supervised_app"
-                print(
-                    f"CPP Process with index {i} in process group {process_group_index}"
+        cpp_range, rust_range = split_process_index_range(
+            get_process_index_range(total_process_count, process_group_index),
+            args.cppprocesses,
+        )
+        demo_apps = (
+            ("CPP", "/opt/supervision_demo/cpp_supervised_app", cpp_range),
+            ("Rust", "/opt/supervision_demo/rust_supervised_app", rust_range),
+        )
+        if not args.verbose:
+            print(
+                f"{len(cpp_range)} CPP and {len(rust_range)} Rust Processes in process group {process_group_index}"
+            )
+        for language, demo_executable_path, demo_range in demo_apps:
+            for i in demo_range:
+                if args.verbose:
+                    print(
+                        f"{language} Process with index {i} in process group {process_group_index}"
+                    )
+
+                demo_process = conf_gen.process_group_add_process(
+                    pg,
+                    f"demo_app{i}_{process_group_name}",
+                    executable_name=demo_executable_path,
+                    uid=0,
+                    gid=0,
                 )
-            else:
-                demo_executable_path = "/opt/supervision_demo/rust_supervised_app"
-                print(
-                    f"Rust Process with index {i} in process group {process_group_index}"
+                conf_gen.process_add_startup_config(
+                    demo_process,
+                    f"demo_app_startup_config_{i}",
+                    process_arguments=["-d50"],
+                    env_variables={
+                        "PROCESSIDENTIFIER": f"{process_group_name}_app{i}",
+                        "CONFIG_PATH": f"/opt/supervision_demo/etc/health_monitor_process_cfg_{i}_{process_group_name}.bin",
+                        "IDENTIFIER": f"demo/demo_application{i}/Port1",
+                    },
+                    scheduling_policy="SCHED_OTHER",
+                    scheduling_priority=0,
+                    enter_timeout=2.0,
+                    exit_timeout=2.0,
+                    depends_on=exec_dependency,
+                    use_in=["Startup"],
                 )
 
-            demo_process = conf_gen.process_group_add_process(
-                pg,
-                f"demo_app{i}_{process_group_name}",
-                executable_name=demo_executable_path,
-                uid=0,
-                gid=0,
-            )
-            conf_gen.process_add_startup_config(
-                demo_process,
-                f"demo_app_startup_config_{i}",
-                process_arguments=["-d50"],
-                env_variables={
-                    "PROCESSIDENTIFIER": f"{process_group_name}_app{i}",
-                    "CONFIG_PATH": f"/opt/supervision_demo/etc/health_monitor_process_cfg_{i}_{process_group_name}.bin",
-                    "IDENTIFIER": f"demo/demo_application{i}/Port1",
-                },
-                scheduling_policy="SCHED_OTHER",
-                scheduling_priority=0,
-                enter_timeout=2.0,
-                exit_timeout=2.0,
-                depends_on=exec_dependency,
-                use_in=["Startup"],
-            )
-
         for i in range(args.non_supervised_processes):
             demo_process_wo_hm = conf_gen.process_group_add_process(
                 pg,
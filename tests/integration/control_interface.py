@@ -18,6 +18,7 @@ from abc import ABC, abstractmethod
 class ControlInterface(ABC):
     """Platform independent interface to execute commands on the target"""
 
+    @staticmethod
     @abstractmethod
     def exec_command_blocking(
         *args: str, timeout=1, **env: str
@@ -34,6 +35,7 @@ class ControlInterface(ABC):
         """
         raise NotImplementedError()
 
+    @staticmethod
     @abstractmethod
     def run_until_file_deployed(
         *args,
@@ -49,7 +51,8 @@ class ControlInterface(ABC):
             *args (str): Command to run with arguments
             timeout (int): Time in seconds to exit after, returning status -1
             file_path (Path): File to wait for
-            poll_interval (float): How often, in seconds, to check if we should terminate the process
+            poll_interval (float): How often, in seconds, to check if the process exited or file_path
+                was deployed, where the OS can not notify about either
             **env (str): Environment vars to set
 
         Returns:
@@ -10,6 +10,12 @@
 #
 # SPDX-License-Identifier: Apache-2.0
 # *******************************************************************************
+from concurrent.futures import ThreadPoolExecutor
+import ctypes
+from functools import lru_cache
+from itertools import repeat
+import select
+import selectors
 import signal
 import subprocess
 import shutil
@@ -18,34 +24,100 @@ import time
 from typing import List, Optional, Tuple, Literal
 from pathlib import Path
 import os
+import re
 from tests.integration.control_interface import ControlInterface
 
 _TIMEOUT_CODE = -1
+# wrappers to run commands in the test root, resolved once
+_FAKEROOT = shutil.which("fakeroot") or "/usr/bin/fakeroot"
+_FAKECHROOT = shutil.which("fakechroot") or "/usr/bin/fakechroot"
+# number of bytes read from the start of a gtest xml file to find the failures
+_GTEST_XML_HEAD_SIZE = 4096
+_FAILURES_RE = re.compile(rb'failures="(\d+)"')
+
+# inotify(7) constants, see <sys/inotify.h>
+_IN_CLOSE_WRITE = 0x00000008
+_IN_MOVED_TO = 0x00000080
+_IN_CREATE = 0x00000100
+_IN_NONBLOCK = 0o4000
+_IN_CLOEXEC = 0o2000000
+
+
+@lru_cache(maxsize=1)
+def _get_libc() -> ctypes.CDLL:
+    """Load the C library once, it provides the inotify functions"""
+    return ctypes.CDLL(None, use_errno=True)
+
+
+class _DirectoryWatch:
+    """Get notified via inotify when files are created in a directory."""
+
+    def __init__(self, directory: Path):
+        libc = _get_libc()
+        self.fd = libc.inotify_init1(_IN_NONBLOCK | _IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        mask = _IN_CREATE | _IN_MOVED_TO | _IN_CLOSE_WRITE
+        if libc.inotify_add_watch(self.fd, os.fsencode(directory), mask) < 0:
+            errno = ctypes.get_errno()
+            os.close(self.fd)
+            raise OSError(errno, f"inotify_add_watch failed for {directory}")
+
+    def drain(self):
+        """Discard all pending events, callers check the file system themselves."""
+        try:
+            while os.read(self.fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+
+    def close(self):
+        os.close(self.fd)
 
 
 class LinuxControl(ControlInterface):
+    @staticmethod
     def exec_command_blocking(*args, timeout=1, **env) -> Tuple[int, str, str]:
         try:
-            res = subprocess.run(
-                args, env=env, capture_output=True, text=True, timeout=timeout
+            # the output is captured as bytes and decoded once, not chunk by chunk
+            res = subprocess.run(args, env=env, capture_output=True, timeout=timeout)
+            return (
+                res.returncode,
+                res.stdout.decode("utf-8", errors="replace"),
+                res.stderr.decode("utf-8", errors="replace"),
             )
-            return res.returncode, "".join(res.stdout), "".join(res.stderr)
         except subprocess.TimeoutExpired as ex:
-            return _TIMEOUT_CODE, ex.output.decode("utf-8"), ex.stderr
+            # the output captured until the timeout may be missing
+            return (
+                _TIMEOUT_CODE,
+                (ex.output or b"").decode("utf-8", errors="replace"),
+                (ex.stderr or b"").decode("utf-8", errors="replace"),
+            )
 
-    def _reader(stream, sink: List[str]):
-        """Read text lines from a stream until EOF and append to sink."""
+    @staticmethod
+    def _reader(streams, sinks: List[bytearray], eof_event: int):
+        """Read from all streams until EOF and append the data to the matching sink.
+        EOF of all streams is signalled by incrementing the eof_event eventfd."""
         try:
-            for line in stream:
-                if not line:
-                    break
-                sink.append(line)
+            with selectors.DefaultSelector() as selector:
+                for stream, sink in zip(streams, sinks):
+                    selector.register(stream, selectors.EVENT_READ, sink)
+                while selector.get_map():
+                    for key, _ in selector.select():
+                        chunk = os.read(key.fd, 65536)
+                        if chunk:
+                            key.data.extend(chunk)
+                        else:
+                            selector.unregister(key.fileobj)
         finally:
-            try:
-                stream.close()
-            except Exception:
-                pass
+            for stream in streams:
+                try:
+                    stream.close()
+                except Exception:
+                    pass
+            os.eventfd_write(eof_event, 1)
 
+    @staticmethod
     def _terminate_process_group(
         proc: subprocess.Popen, sigterm_timeout_seconds: float
     ):
@@ -54,23 +126,27 @@ class LinuxControl(ControlInterface):
         if proc.poll() is not None:
             return  # already exited
 
+        # The process is only reaped by poll() and wait(), so until they report its exit
+        # its pid, which is also the id of its process group, can not be reused.
         try:
             os.killpg(proc.pid, signal.SIGTERM)
         except Exception:
             proc.terminate()
 
-        deadline = time.time() + sigterm_timeout_seconds
-        while time.time() < deadline:
-            if proc.poll() is not None:
-                return
-            time.sleep(0.05)
+        try:
+            proc.wait(timeout=sigterm_timeout_seconds)
+            return
+        except subprocess.TimeoutExpired:
+            pass
 
         # Force kill
         try:
             os.killpg(proc.pid, signal.SIGKILL)
         except Exception:
             proc.kill()
+        proc.wait()
 
+    @staticmethod
     def run_until_file_deployed(
         *args,
         timeout=1,
@@ -78,32 +154,53 @@ class LinuxControl(ControlInterface):
         poll_interval=0.05,
         **env,
     ) -> Tuple[int, str, str]:
+        # Wait for the file via inotify and only fall back to plain polling if the
+        # watch can not be set up. The watch is set up before the process is started,
+        # so that no file creation can be missed.
+        try:
+            file_path.parent.mkdir(parents=True, exist_ok=True)
+            watch = _DirectoryWatch(file_path.parent)
+        except (AttributeError, OSError):
+            watch = None
+
         proc = subprocess.Popen(
-            ("/usr/bin/fakeroot", "/usr/bin/fakechroot", "-s", "chroot", ".", *args),
+            (_FAKEROOT, _FAKECHROOT, "-s", "chroot", ".", *args),
             env=env,
             stdout=subprocess.PIPE,
             stderr=subprocess.PIPE,
-            bufsize=1,
-            text=True,
-            preexec_fn=os.setsid,  # start the process in its own process group so we can signal the whole group
+            bufsize=0,
+            start_new_session=True,  # start the process in its own process group so we can signal the whole group
         )
 
-        # Start reader threads to capture stdout/stderr without blocking
-        stdout_lines: List[str] = []
-        stderr_lines: List[str] = []
-        t_out = threading.Thread(
-            target=LinuxControl._reader, args=(proc.stdout, stdout_lines), daemon=True
-        )
-        t_err = threading.Thread(
-            target=LinuxControl._reader, args=(proc.stderr, stderr_lines), daemon=True
+        # Start a reader thread to capture stdout/stderr without blocking
+        stdout_buf = bytearray()
+        stderr_buf = bytearray()
+        # the reader wakes up the loop below once both streams are closed
+        eof_event = os.eventfd(0, os.EFD_CLOEXEC | os.EFD_NONBLOCK)
+        t_reader = threading.Thread(
+            target=LinuxControl._reader,
+            args=(
+                (proc.stdout, proc.stderr),
+                (stdout_buf, stderr_buf),
+                eof_event,
+            ),
+            daemon=True,
         )
-        t_out.start()
-        t_err.start()
+        t_reader.start()
 
         start = time.time()
         deadline = start + timeout
 
         exit_code: Optional[int] = None
+        streams_closed = False
+
+        wake_fds = [eof_event] if watch is None else [eof_event, watch.fd]
+        # the pidfd becomes readable once the process exited (Linux 5.3+)
+        try:
+            pidfd = os.pidfd_open(proc.pid)
+            wake_fds.append(pidfd)
+        except (AttributeError, OSError):
+            pidfd = None
 
         try:
             while True:
@@ -117,7 +214,7 @@ class LinuxControl(ControlInterface):
                 if file_path.exists():
                     exit_code = 0
                     LinuxControl._terminate_process_group(proc, timeout)
-                    os.remove(file_path)
+                    file_path.unlink(missing_ok=True)
                     break
 
                 if now >= deadline:
@@ -125,17 +222,44 @@ class LinuxControl(ControlInterface):
                     LinuxControl._terminate_process_group(proc, timeout)
                     break
 
-                time.sleep(poll_interval)
+                # Sleep until the process exits, the output streams are closed or a file is
+                # created. Whatever can not be waited for is polled every poll_interval.
+                wait_time = deadline - now
+                if watch is None or pidfd is None:
+                    wait_time = min(poll_interval, wait_time)
+                readable, _, _ = select.select(wake_fds, [], [], wait_time)
+                if eof_event in readable:
+                    os.eventfd_read(eof_event)
+                    streams_closed = True
+                if watch is not None and watch.fd in readable:
+                    watch.drain()
         except KeyboardInterrupt:
             LinuxControl._terminate_process_group(proc, timeout)
+        finally:
+            if watch is not None:
+                watch.close()
+            if pidfd is not None:
+                os.close(pidfd)
 
-        # Ensure readers finish
-        t_out.join(timeout=2.0)
-        t_err.join(timeout=2.0)
+        # Ensure reader finishes. Once it signalled EOF, all output has been collected.
+        if not streams_closed:
+            try:
+                os.eventfd_read(eof_event)
+                streams_closed = True
+            except BlockingIOError:
+                t_reader.join(timeout=2.0)
+        # a reader that did not signal EOF yet would do so to a closed, possibly reused fd
+        if streams_closed or not t_reader.is_alive():
+            os.close(eof_event)
 
-        return exit_code, "".join(stdout_lines), "".join(stderr_lines)
+        return (
+            exit_code,
+            stdout_buf.decode("utf-8", errors="replace"),
+            stderr_buf.decode("utf-8", errors="replace"),
+        )
 
 
+@lru_cache(maxsize=1)
 def get_common_interface() -> ControlInterface:
     """Get a platform independent façade to execute commands on the target"""
     match get_platform():
@@ -151,6 +275,7 @@ def get_platform() -> Literal["linux", "qemu"]:
     return "linux"
 
 
+@lru_cache(maxsize=1)
 def get_bazel_out_dir() -> Path:
     """Files written to this location are accessible from `bazel-out` when
     `--remote_download_outputs=all`
@@ -158,21 +283,32 @@ def get_bazel_out_dir() -> Path:
     return Path(os.environ.get("TEST_UNDECLARED_OUTPUTS_DIR"))
 
 
+def _has_failures(file: os.DirEntry, out_dir: Path) -> bool:
+    """Check a gtest xml file for failures and copy it to the bazel outputs"""
+    # the failures of the whole run are reported in the root element
+    with open(file, "rb") as f:
+        gtest_xml = f.read(_GTEST_XML_HEAD_SIZE)
+    failures = _FAILURES_RE.search(gtest_xml)
+    shutil.copy(file, out_dir)
+    return failures is None or failures[1] != b"0"
+
+
 def check_for_failures(path: Path, expected_count: int):
     """Check expected_count xml files for failures, raising an exception if
     a failure is found or a different number of xml files are found.
     """
-    failing_files = []
-    checked_files = []
-    for file in path.iterdir():
-        if file.suffix == ".xml":
-            gtest_xml = open(file).read()
-            query = 'failures="'
-            failure_number = gtest_xml[gtest_xml.find(query) + len(query)]
-            if failure_number != "0":
-                failing_files.append(file.name)
-            checked_files.append(file.name)
-            shutil.copy(file, get_bazel_out_dir())
+    out_dir = get_bazel_out_dir()
+    with os.scandir(path) as entries:
+        xml_files = [
+            entry
+            for entry in entries
+            if entry.name.endswith(".xml") and entry.is_file()
+        ]
+    # checking the files is dominated by file I/O, so they are checked concurrently
+    with ThreadPoolExecutor(max_workers=min(16, len(xml_files) or 1)) as pool:
+        failed = list(pool.map(_has_failures, xml_files, repeat(out_dir)))
+    failing_files = [file.name for file, f in zip(xml_files, failed) if f]
+    checked_files = [file.name for file in xml_files]
     if len(failing_files) > 0:
         raise RuntimeError(
             f"Failures found in the following files:\n {'\n'.join(failing_files)}"